@@ -1,19 +1,143 @@
-import json
+from __future__ import annotations
+
 from pathlib import Path
 import requests
+from requests.adapters import HTTPAdapter
+from urllib3.util.retry import Retry
 from datetime import datetime
 import asyncio
-from ddgs import DDGS
-from crawl4ai import AsyncWebCrawler, BrowserConfig, CrawlerRunConfig, CacheMode
+import atexit
+import concurrent.futures
+import threading
 import re
 import sys
 import os
+import random
+import socket
+import mmap
 import base64
-from urllib.parse import urlparse, parse_qs, unquote
+import functools
+import binascii
+import hashlib
+import sqlite3
+import time
+from collections import OrderedDict
+from typing import TYPE_CHECKING, Any
+from urllib.parse import urlparse, parse_qs, unquote, urljoin
+
+# crawl4ai (Playwright) and ddgs are slow to import, so they are imported
+# inside the tools that use them rather than at startup.
+if TYPE_CHECKING:
+    from crawl4ai import AsyncWebCrawler, CrawlerRunConfig
+    from ddgs import DDGS
+
+try:
+    # libuv-based event loop; not available on Windows.
+    import uvloop
+except ImportError:
+    uvloop = None
+
+try:
+    import orjson
+except ImportError:
+    # stdlib fallback with the same output, just slower
+    import json
+
+    orjson = None
 
 # Updated by main.py after each model call (OpenAI Responses API usage object)
 last_usage: dict | None = None
 
+# Append-only knowledge store, one {"id", "text"} JSON object per line.
+_KNOWLEDGE_FILE = Path("research_knowledge") / "knowledge.jsonl"
+# Next id for save_knowledge; lazily read from knowledge.jsonl on first save.
+_knowledge_next_id: int | None = None
+_knowledge_lock = threading.Lock()
+# In-memory copy of the knowledge base, filled by prime_knowledge_cache.
+_knowledge_cache: list[str] | None = None
+
+# Browser shared by all crawls. It lives on its own event loop thread so the
+# Chromium startup cost is paid once per process instead of once per URL.
+_crawl_loop: asyncio.AbstractEventLoop | None = None
+_crawler: AsyncWebCrawler | None = None
+_crawler_lock = threading.Lock()
+# Seconds to wait for a single browser crawl before giving up on it.
+_CRAWL_TIMEOUT_S = 60
+# Pages a batch crawl loads at once; batch timeouts scale with the number of rounds.
+_CRAWL_BATCH_PERMITS = 10
+# Upper bound on a single tool call; main.py reports calls still running after
+# this as failed. Batch crawls finish (or cancel) this long before that deadline.
+TOOL_TIMEOUT_S = 300
+_TOOL_DEADLINE_MARGIN_S = 30
+
+# Shared DuckDuckGo client. Parallel searches are limited to a few at a time
+# and their starts are jittered, since DuckDuckGo rate-limits per IP.
+_ddgs: DDGS | None = None
+_ddgs_lock = threading.Lock()
+_ddgs_next_start = 0.0
+_DDGS_SEMAPHORE = threading.BoundedSemaphore(3)
+
+# Pooled session so repeated Wikipedia lookups reuse the same TLS connection.
+_WIKI_SESSION = requests.Session()
+# Wikipedia API requires a descriptive User-Agent identifying the bot
+# See: https://foundation.wikimedia.org/wiki/Policy:Wikimedia_Foundation_User-Agent_Policy
+_WIKI_SESSION.headers.update(
+    {"User-Agent": "SearchAgent/1.0 (AI Research Tool Bot; https://github.com/Dariton4000/searchagent)"}
+)
+# Sized for parallel tool calls; transient errors and rate limits are retried with backoff.
+_WIKI_SESSION.mount(
+    "https://",
+    HTTPAdapter(
+        pool_connections=16,
+        pool_maxsize=32,
+        max_retries=Retry(total=3, backoff_factor=0.3, status_forcelist=[429, 500, 502, 503, 504]),
+    ),
+)
+# Caps concurrent Wikipedia requests when the model fans out many lookups at once.
+_WIKI_SEMAPHORE = threading.BoundedSemaphore(8)
+
+# Plain HTTP session for crawling static pages without launching the browser.
+_HTTP_SESSION = requests.Session()
+_HTTP_SESSION.headers.update(
+    {"User-Agent": "Mozilla/5.0 (compatible; SearchAgent/1.0; +https://github.com/Dariton4000/searchagent)"}
+)
+# Pages with less extracted text than this are assumed to need JavaScript.
+_STATIC_MIN_CHARS = 2000
+# Static pages are read up to this many (decompressed) bytes; the rest is ignored.
+_STATIC_MAX_BYTES = 5 * 1024 * 1024
+# Pages with fewer <p> tags than this are treated as JavaScript shells without parsing them.
+_STATIC_MIN_PARAGRAPHS = 3
+_PARAGRAPH_TAG_RE = re.compile(rb"<p[\s>]", re.IGNORECASE)
+# Hosts whose pages turned out to need the browser; they skip the fast path.
+# A host lands here only after several misses in a row, so one short stub or
+# index page doesn't send a whole site (Wikipedia, GitHub) through Chromium.
+_BROWSER_HOSTS: set[str] = set()
+_BROWSER_HOST_MISSES = 3
+_static_misses: dict[str, int] = {}
+_static_misses_lock = threading.Lock()
+
+# search_and_crawl limits: results crawled per call and characters kept per page.
+_SEARCH_CRAWL_MAX_PAGES = 6
+_SEARCH_CRAWL_MAX_CHARS = 20_000
+
+# Cache for idempotent tool results (searches, Wikipedia extracts, crawled
+# pages): an in-memory LRU in front of a SQLite file that persists across runs.
+# Wikipedia sends Cache-Control: max-age=0 on API responses, so fixed
+# per-kind TTLs are used instead. Expired Wikipedia extracts are kept around
+# and revalidated with If-None-Match / If-Modified-Since when the response
+# carried validators.
+_CACHE_DB_PATH = Path("http_cache") / "cache.db"
+_CACHE_TTL = {  # seconds
+    "duckduckgo": 24 * 3600,
+    "crawl": 24 * 3600,
+    "wikipedia": 7 * 24 * 3600,
+    "wikipedia_validators": 30 * 24 * 3600,
+}
+_CACHE_MEMORY_SIZE = 256
+_cache_memory: OrderedDict[str, tuple[float, str]] = OrderedDict()
+_cache_db: sqlite3.Connection | None = None
+_cache_lock = threading.Lock()
+
 _CONSOLE_TEXT_TRANSLATION = str.maketrans(
     {
         "\u00a0": " ",  # no-break space
@@ -28,6 +152,99 @@ _CONSOLE_TEXT_TRANSLATION = str.maketrans(
     }
 )
 
+# Strips terminal escapes from untrusted text (titles, URLs) in a single pass.
+_ESC_STRIP_TABLE = {0x1B: None}
+_TITLE_TRANSLATION = {**_CONSOLE_TEXT_TRANSLATION, **_ESC_STRIP_TABLE}
+
+_BASE64_RE = re.compile(r"[A-Za-z0-9_\-+/=]+")
+_TRAILING_DASH_RE = re.compile(r"\s*-\s*$")
+_TITLE_SANITIZE_RE = re.compile(r"[^\w\s-]")
+# Code-line anchors (mkdocs "#__codelineno-*") that crawl4ai turns into links; pure token noise.
+_CODELINE_LINK_RE = re.compile(r"\[[^\]\n]*\]\([^)\s]*#__codelineno[^)]*\)|\([^)\s]*#__codelineno[^)]*\)")
+_BLANK_LINES_RE = re.compile(r"\n(?:[ \t]*\n){2,}")
+# Same filter as _TITLE_SANITIZE_RE as a translate table, for the common all-ASCII title.
+_TITLE_SANITIZE_ASCII = str.maketrans("", "", "".join(c for c in map(chr, range(128)) if _TITLE_SANITIZE_RE.match(c)))
+
+
+def _cache_key(kind: str, key: str) -> str:
+    return hashlib.blake2b(f"{kind}\0{key}".encode("utf-8"), digest_size=20).hexdigest()
+
+
+def _cache_connection() -> sqlite3.Connection:
+    """Opens the cache database on first use. Callers must hold _cache_lock."""
+    global _cache_db
+    if _cache_db is None:
+        _CACHE_DB_PATH.parent.mkdir(parents=True, exist_ok=True)
+        conn = sqlite3.connect(_CACHE_DB_PATH, check_same_thread=False)
+        conn.execute("PRAGMA journal_mode=WAL")
+        conn.execute("PRAGMA synchronous=NORMAL")
+        conn.execute("PRAGMA cache_size=-65536")
+        conn.execute("CREATE TABLE IF NOT EXISTS kv(k TEXT PRIMARY KEY, v BLOB, ts INTEGER)")
+        # drop rows no kind can use anymore so the file doesn't grow across runs
+        conn.execute("DELETE FROM kv WHERE ts < ?", (int(time.time() - max(_CACHE_TTL.values())),))
+        conn.commit()
+        _cache_db = conn
+    return _cache_db
+
+
+def _cache_get(kind: str, key: str, ttl: float | None = None) -> str | None:
+    """Returns a cached tool result if it is younger than ttl (default: the TTL for its kind)."""
+    k = _cache_key(kind, key)
+    oldest = time.time() - (_CACHE_TTL[kind] if ttl is None else ttl)
+    try:
+        with _cache_lock:
+            hit = _cache_memory.get(k)
+            if hit is not None and hit[0] >= oldest:
+                _cache_memory.move_to_end(k)
+                return hit[1]
+            row = _cache_connection().execute("SELECT v, ts FROM kv WHERE k = ?", (k,)).fetchone()
+            if row is None or row[1] < oldest:
+                return None
+            value = bytes(row[0]).decode("utf-8")
+            _cache_remember(k, row[1], value)
+            return value
+    except (sqlite3.Error, OSError, UnicodeDecodeError):
+        return None
+
+
+def _cache_set(kind: str, key: str, value: str) -> None:
+    k = _cache_key(kind, key)
+    now = int(time.time())
+    try:
+        with _cache_lock:
+            _cache_remember(k, now, value)
+            conn = _cache_connection()
+            conn.execute(
+                "INSERT OR REPLACE INTO kv(k, v, ts) VALUES (?, ?, ?)",
+                (k, value.encode("utf-8"), now),
+            )
+            conn.commit()
+    except (sqlite3.Error, OSError):
+        # Caching is best-effort; a failed write just means a later cache miss.
+        pass
+
+
+def _cache_remember(k: str, ts: float, value: str) -> None:
+    """Adds an entry to the in-memory LRU. Callers must hold _cache_lock."""
+    _cache_memory[k] = (ts, value)
+    _cache_memory.move_to_end(k)
+    while len(_cache_memory) > _CACHE_MEMORY_SIZE:
+        _cache_memory.popitem(last=False)
+
+
+def json_dumps(obj: Any) -> bytes:
+    """Serializes obj to compact UTF-8 JSON (orjson when installed)."""
+    if orjson is not None:
+        return orjson.dumps(obj, option=orjson.OPT_NON_STR_KEYS)
+    return json.dumps(obj, ensure_ascii=False, separators=(",", ":")).encode("utf-8")
+
+
+def json_loads(data: bytes | str) -> Any:
+    """Parses JSON from bytes or str. Raises ValueError on invalid input."""
+    if orjson is not None:
+        return orjson.loads(data)
+    return json.loads(data)
+
 
 def _normalize_whitespace(text: str) -> str:
     return " ".join(text.split())
@@ -77,16 +294,17 @@ def _extract_target_url(href: str) -> str | None:
             u = qs.get("u", [None])[0]
             if u:
                 u = u.strip()
-                # Often base64 of a percent-encoded URL.
-                try:
-                    padded = u + ("=" * (-len(u) % 4))
-                    decoded = base64.b64decode(padded, validate=False)
-                    decoded_str = decoded.decode("utf-8", errors="replace")
-                    target = unquote(decoded_str).strip()
-                    if target.startswith(("http://", "https://")):
-                        return target
-                except Exception:
-                    pass
+                # Often base64 of a percent-encoded URL. Extra padding is
+                # ignored by the decoder, so no length math is needed.
+                if _BASE64_RE.fullmatch(u):
+                    try:
+                        decoded = base64.urlsafe_b64decode(u + "===")
+                    except (binascii.Error, ValueError):
+                        decoded = b""
+                    if decoded.startswith((b"http", b"%68")):
+                        target = unquote(decoded.decode("utf-8", errors="replace")).strip()
+                        if target.startswith(("http://", "https://")):
+                            return target
 
                 target = unquote(u).strip()
                 if target.startswith(("http://", "https://")):
@@ -119,6 +337,7 @@ def _url_display_text(url: str, *, max_chars: int = 80) -> str:
     return _truncate_middle(url, max_chars)
 
 
+@functools.lru_cache(maxsize=1)
 def _supports_osc8_hyperlinks() -> bool:
     if not getattr(sys.stdout, "isatty", lambda: False)():
         return False
@@ -139,8 +358,8 @@ def _supports_osc8_hyperlinks() -> bool:
 def _osc8_link(url: str, text: str) -> str:
     esc = "\x1b"
     st = esc + "\\"
-    safe_url = url.replace(esc, "")
-    safe_text = text.replace(esc, "")
+    safe_url = url.translate(_ESC_STRIP_TABLE)
+    safe_text = text.translate(_ESC_STRIP_TABLE)
     return f"{esc}]8;;{safe_url}{st}{safe_text}{esc}]8;;{st}"
 
 
@@ -165,73 +384,289 @@ def _print_duckduckgo_results(query: str, results: list[dict]) -> None:
         _safe_print(f"DuckDuckGo results for: {query} (none)")
         return
 
-    _safe_print(f"DuckDuckGo results for: {query} ({len(results)}):")
+    lines = [f"DuckDuckGo results for: {query} ({len(results)}):"]
     use_osc8 = _supports_osc8_hyperlinks()
     for idx, r in enumerate(results, start=1):
-        title = _normalize_whitespace(str(r.get("title", ""))).strip() or "(no title)"
-        title = title.translate(_CONSOLE_TEXT_TRANSLATION)
-        title = re.sub(r"\s*-\s*$", "", title).strip() or "(no title)"
+        title = _normalize_whitespace(str(r.get("title", "")).translate(_TITLE_TRANSLATION))
+        title = _TRAILING_DASH_RE.sub("", title).strip() or "(no title)"
         href = str(r.get("href", "")).strip()
 
         if href:
             target = _extract_target_url(href) or href
             display = _url_display_text(target, max_chars=80)
             link_text = _osc8_link(target, display) if use_osc8 else target
-            _safe_print(f"{idx}. {title} - {link_text}")
+            lines.append(f"{idx}. {title} - {link_text}")
         else:
-            _safe_print(f"{idx}. {title} - (no url)")
+            lines.append(f"{idx}. {title} - (no url)")
+
+    # One write and flush for the whole block instead of one per row.
+    _safe_print("\n".join(lines))
+
+def _last_line(path: Path, block_size: int = 4096) -> bytes:
+    """Reads the last non-empty line of a file by seeking backwards from the end."""
+    with path.open("rb") as f:
+        pos = f.seek(0, os.SEEK_END)
+        tail = b""
+        while pos > 0:
+            step = min(block_size, pos)
+            pos -= step
+            f.seek(pos)
+            tail = f.read(step) + tail
+            stripped = tail.rstrip(b"\r\n")
+            newline = stripped.rfind(b"\n")
+            if newline != -1:
+                return stripped[newline + 1 :]
+        return tail.strip()
+
+
+def _scan_max_knowledge_id(knowledge_file: Path) -> int:
+    last_id = 0
+    with knowledge_file.open("rb") as f:
+        for line in f:
+            try:
+                last_id = max(last_id, int(json_loads(line)["id"]))
+            except (KeyError, TypeError, ValueError):
+                continue
+    return last_id
+
+
+def _next_knowledge_id(knowledge_file: Path) -> int:
+    """Returns the next free knowledge id, reading the store only on first use."""
+    global _knowledge_next_id
+    if _knowledge_next_id is None:
+        last_id = 0
+        if knowledge_file.exists():
+            # a crash mid-append can leave a torn last line; terminate it so
+            # the next entry starts on its own line instead of merging into it
+            with knowledge_file.open("rb+") as f:
+                if f.seek(0, os.SEEK_END) > 0:
+                    f.seek(-1, os.SEEK_END)
+                    if f.read(1) != b"\n":
+                        f.write(b"\n")
+            # ids are appended in increasing order, so the last line holds the max
+            try:
+                last_id = int(json_loads(_last_line(knowledge_file))["id"])
+            except (KeyError, TypeError, ValueError):
+                # torn or hand-edited last line; fall back to a full scan
+                last_id = _scan_max_knowledge_id(knowledge_file)
+        _knowledge_next_id = last_id + 1
+    return _knowledge_next_id
+
+
+def _read_knowledge_file(knowledge_file: Path) -> list[str]:
+    if not knowledge_file.exists():
+        return []
+    entries = []
+    with knowledge_file.open("rb") as f:
+        # mmap cannot map an empty file
+        if os.fstat(f.fileno()).st_size == 0:
+            return []
+        # parse straight from the mapped pages instead of buffered reads;
+        # lines are appended in id order, so no sorting is needed
+        with mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ) as mm:
+            for line in iter(mm.readline, b""):
+                try:
+                    entries.append(json_loads(line)["text"])
+                except (KeyError, TypeError, ValueError):
+                    continue
+    return entries
+
+
+def prime_knowledge_cache() -> None:
+    """Loads the knowledge base into memory so get_all_knowledge doesn't touch disk.
+
+    main.py runs this on a background thread while the model is still thinking.
+    """
+    global _knowledge_cache
+    with _knowledge_lock:
+        if _knowledge_cache is None:
+            _knowledge_cache = _read_knowledge_file(_KNOWLEDGE_FILE)
+
 
 def save_knowledge(knowledge: str) -> str:
     """Adds new knowledge for later use."""
-    knowledge_file = Path("research_knowledge") / "knowledge.json"
-    # load existing or start fresh
-    if knowledge_file.exists():
-        with knowledge_file.open("r") as f:
-            try:
-                data = json.load(f)
-            except json.JSONDecodeError:
-                data = {}
-    else:
-        data = {}
-    # determine next numeric key
-    nums = [int(k) for k in data.keys() if k.isdigit()]
-    next_num = max(nums, default=0) + 1
-    data[str(next_num)] = knowledge
-    # write back
-    with knowledge_file.open("w") as f:
-        json.dump(data, f, indent=2)
+    global _knowledge_next_id
+    knowledge = _clean_markdown(knowledge)
+    # tool calls may run concurrently; keep id allocation and the append together
+    with _knowledge_lock:
+        next_num = _next_knowledge_id(_KNOWLEDGE_FILE)
+        # append a single line instead of rewriting the whole store
+        with _KNOWLEDGE_FILE.open("ab") as f:
+            f.write(json_dumps({"id": next_num, "text": knowledge}) + b"\n")
+        _knowledge_next_id = next_num + 1
+        if _knowledge_cache is not None:
+            _knowledge_cache.append(knowledge)
     print(f"Knowledge {next_num} saved: {knowledge}")
     return f"Knowledge {next_num} saved successfully."
 
 def get_all_knowledge() -> list:
     """Returns all entries in the knowledge base."""
     print("Retrieving all knowledge entries")
-    knowledge_file = Path("research_knowledge") / "knowledge.json"
-    if not knowledge_file.exists():
-        return []
-    with knowledge_file.open("r") as f:
-        try:
-            data = json.load(f)
-            return [data[key] for key in sorted(data.keys(), key=int)]
-        except json.JSONDecodeError:
-            return []
+    prime_knowledge_cache()
+    with _knowledge_lock:
+        return list(_knowledge_cache or [])
         
 
-async def crawl4aiasync(url: str):
-    browser_conf = BrowserConfig(headless=True)  # or False to see the browser
-    run_conf = CrawlerRunConfig(
+def _get_crawler() -> tuple[asyncio.AbstractEventLoop, AsyncWebCrawler]:
+    """Returns the shared event loop and browser, starting them on first use."""
+    global _crawl_loop, _crawler
+    with _crawler_lock:
+        if _crawler is None or _crawl_loop is None:
+            from crawl4ai import AsyncWebCrawler, BrowserConfig
+
+            loop = uvloop.new_event_loop() if uvloop is not None else asyncio.new_event_loop()
+            threading.Thread(target=loop.run_forever, name="crawl4ai-loop", daemon=True).start()
+            crawler = AsyncWebCrawler(config=BrowserConfig(headless=True))  # or False to see the browser
+            try:
+                asyncio.run_coroutine_threadsafe(crawler.__aenter__(), loop).result()
+            except Exception:
+                loop.call_soon_threadsafe(loop.stop)
+                raise
+            _crawl_loop, _crawler = loop, crawler
+            atexit.register(_close_crawler)
+        return _crawl_loop, _crawler
+
+
+def _close_crawler() -> None:
+    """Shuts down the shared browser and its event loop (registered with atexit)."""
+    global _crawl_loop, _crawler
+    loop, crawler = _crawl_loop, _crawler
+    _crawl_loop, _crawler = None, None
+    if loop is None or crawler is None:
+        return
+    try:
+        asyncio.run_coroutine_threadsafe(crawler.__aexit__(None, None, None), loop).result(timeout=10)
+    except Exception:
+        pass
+    loop.call_soon_threadsafe(loop.stop)
+
+
+def _html_to_markdown(html: bytes, encoding: str | None = None, base_url: str = "") -> str:
+    """Converts static HTML to lightweight markdown (headings, links, list items, table rows, paragraphs).
+
+    encoding is the charset from the Content-Type header, if it named one;
+    otherwise BeautifulSoup detects it from the BOM or <meta charset>.
+    Relative links are resolved against base_url.
+    """
+    from bs4 import BeautifulSoup
+
+    soup = BeautifulSoup(html, "html.parser", from_encoding=encoding)
+    for tag in soup(["head", "script", "style", "noscript", "template", "svg", "nav", "header", "footer", "aside", "form"]):
+        tag.decompose()
+    # keep link targets so the agent can follow them from the crawled page
+    for link in soup.find_all("a", href=True):
+        text = link.get_text(" ", strip=True)
+        href = link["href"].strip()
+        if text and href and not href.startswith(("#", "javascript:", "mailto:")):
+            link.replace_with(f"[{text}]({urljoin(base_url, href)})")
+    # separate cells so "12 | 34" doesn't collapse into "1234"
+    for row in soup.find_all("tr"):
+        for cell in row.find_all(["td", "th"], recursive=False)[1:]:
+            cell.insert(0, " | ")
+    for level in range(1, 7):
+        for heading in soup.find_all(f"h{level}"):
+            heading.replace_with(f"\n{'#' * level} {heading.get_text(' ', strip=True)}\n")
+    for item in soup.find_all("li"):
+        item.insert(0, "\n- ")
+    for block in soup.find_all(["p", "div", "br", "li", "ul", "ol", "tr", "table", "pre", "blockquote", "section", "article"]):
+        block.insert_after("\n")
+
+    lines = (_normalize_whitespace(line) for line in soup.get_text().splitlines())
+    return "\n".join(line for line in lines if line)
+
+
+def _note_static_result(host: str, hit: bool) -> None:
+    """Tracks consecutive fast-path misses per host; enough of them move it to _BROWSER_HOSTS."""
+    with _static_misses_lock:
+        if hit:
+            _static_misses.pop(host, None)
+            return
+        misses = _static_misses.get(host, 0) + 1
+        _static_misses[host] = misses
+        if misses >= _BROWSER_HOST_MISSES:
+            _BROWSER_HOSTS.add(host)
+
+
+def _fetch_static_markdown(url: str) -> str | None:
+    """Fetches url with a plain HTTP GET and converts it to markdown.
+
+    Returns None when the page should go through the browser instead: the
+    request failed, the response is not HTML, or there is too little text
+    (likely rendered by JavaScript). Hosts that needed the browser several
+    times in a row skip the fast path afterwards.
+    """
+    host = (urlparse(url).netloc or "").lower()
+    if host in _BROWSER_HOSTS:
+        return None
+    try:
+        # stream so PDFs, datasets and videos are rejected from the headers
+        # instead of being downloaded into memory first
+        with _HTTP_SESSION.get(url, timeout=10, stream=True) as response:
+            response.raise_for_status()
+            content_type = response.headers.get("Content-Type", "")
+            if "text/html" not in content_type:
+                return None
+            chunks = []
+            size = 0
+            for chunk in response.iter_content(chunk_size=64 * 1024):
+                chunks.append(chunk)
+                size += len(chunk)
+                if size >= _STATIC_MAX_BYTES:
+                    break
+            content = b"".join(chunks)[:_STATIC_MAX_BYTES]
+    except requests.RequestException:
+        return None
+    # cheap byte scan first; a JS app shell isn't worth a full BeautifulSoup parse
+    if len(_PARAGRAPH_TAG_RE.findall(content)) < _STATIC_MIN_PARAGRAPHS:
+        _note_static_result(host, hit=False)
+        return None
+
+    try:
+        # requests falls back to ISO-8859-1 for text/html without a charset,
+        # so only trust its encoding when the header actually named one
+        encoding = response.encoding if "charset=" in content_type.lower() else None
+        markdown = _html_to_markdown(content, encoding, response.url or url)
+    except Exception:
+        return None
+    if len(markdown) < _STATIC_MIN_CHARS:
+        _note_static_result(host, hit=False)
+        return None
+    _note_static_result(host, hit=True)
+    return markdown
+
+
+def _clean_markdown(text: str) -> str:
+    """Drops code-line anchor links and collapses runs of blank lines."""
+    if "#__codelineno" in text:
+        text = _CODELINE_LINK_RE.sub("", text)
+    return _BLANK_LINES_RE.sub("\n\n", text)
+
+
+def _markdown_text(markdown: Any) -> str:
+    """Converts a crawl4ai markdown result to a cleaned str once, at the edge."""
+    if not isinstance(markdown, str):
+        markdown = "" if markdown is None else str(markdown)
+    return _clean_markdown(markdown)
+
+
+@functools.lru_cache(maxsize=1)
+def _crawl_run_config() -> CrawlerRunConfig:
+    """Run config shared by every crawl; built once on first use."""
+    from crawl4ai import CrawlerRunConfig, CacheMode
+
+    # crawl4ai's own cache stays off: results are cached in http_cache/ with a TTL
+    return CrawlerRunConfig(
         cache_mode=CacheMode.BYPASS
     )
 
-    async with AsyncWebCrawler(config=browser_conf) as crawler:
-        result = await crawler.arun(
-            url=url,
-            config=run_conf
-        )
-        # needs to be result.markdown to return the markdown content
-        # ignore the warning about the return type, it is correct
-        #counts tokens in the markdown content
-        return result.markdown  # type: ignore
+
+async def crawl4aiasync(crawler: AsyncWebCrawler, url: str) -> str:
+    result = await crawler.arun(
+        url=url,
+        config=_crawl_run_config()
+    )
+    # needs to be result.markdown to return the markdown content
+    return _markdown_text(result.markdown)
 
 def crawl4ai(url: str):
     """Crawls a given URL and returns the text content.
@@ -246,8 +681,136 @@ def crawl4ai(url: str):
         The text content of the page in markdown format.
     """
     print(f"Crawling {url}")
-    result = asyncio.run(crawl4aiasync(url))
-    return result
+    cached = _cache_get("crawl", url)
+    if cached is not None:
+        return cached
+    markdown = _fetch_static_markdown(url)
+    if markdown is not None:
+        _cache_set("crawl", url, markdown)
+        return markdown
+    loop, crawler = _get_crawler()
+    future = asyncio.run_coroutine_threadsafe(crawl4aiasync(crawler, url), loop)
+    try:
+        markdown = future.result(timeout=_CRAWL_TIMEOUT_S)
+        if markdown:
+            _cache_set("crawl", url, markdown)
+        return markdown
+    except concurrent.futures.TimeoutError:
+        # free the browser page instead of letting a stuck crawl hold it
+        future.cancel()
+        print(f"Crawling {url} timed out after {_CRAWL_TIMEOUT_S}s")
+        return f"Error crawling {url}: timed out after {_CRAWL_TIMEOUT_S} seconds."
+
+async def crawl4ai_batch_async(crawler: AsyncWebCrawler, urls: list[str]):
+    from crawl4ai import MemoryAdaptiveDispatcher
+
+    # the dispatcher overlaps page loads and backs off when memory runs low
+    dispatcher = MemoryAdaptiveDispatcher(
+        memory_threshold_percent=80,
+        max_session_permit=_CRAWL_BATCH_PERMITS,
+    )
+    return await crawler.arun_many(urls=urls, config=_crawl_run_config(), dispatcher=dispatcher)
+
+def crawl4ai_batch(urls: list[str]) -> str:
+    """Crawls several URLs concurrently and returns the text content of each.
+        Prefer this over repeated crawl4ai calls when you already have multiple links.
+
+    Do not use this tool to crawl Wikipedia pages directly.
+
+    Args:
+        urls: The URLs to crawl.
+        each needs to start with http:// or https://
+    Returns:
+        A JSON list with the url and markdown content (or an error) for each page.
+    """
+    print(f"Crawling {len(urls)} URLs: {', '.join(urls)}")
+    return json_dumps(_crawl_pages(urls)).decode()
+
+
+def _crawl_pages(urls: list[str]) -> list[dict[str, str]]:
+    """Crawls urls (cache, then static fetch, then browser) into {url, content | error} dicts."""
+    deadline = time.monotonic() + TOOL_TIMEOUT_S - _TOOL_DEADLINE_MARGIN_S
+    pages = []
+    uncached = []
+    for u in urls:
+        cached = _cache_get("crawl", u)
+        if cached is not None:
+            pages.append({"url": u, "content": cached})
+        else:
+            uncached.append(u)
+
+    remaining = []
+    if uncached:
+        with concurrent.futures.ThreadPoolExecutor(max_workers=min(8, len(uncached))) as pool:
+            static = list(pool.map(_fetch_static_markdown, uncached))
+        for u, md in zip(uncached, static):
+            if md is None:
+                remaining.append(u)
+            else:
+                _cache_set("crawl", u, md)
+                pages.append({"url": u, "content": md})
+
+    if remaining:
+        loop, crawler = _get_crawler()
+        future = asyncio.run_coroutine_threadsafe(crawl4ai_batch_async(crawler, remaining), loop)
+        rounds = -(-len(remaining) // _CRAWL_BATCH_PERMITS)
+        # never outlive the tool timeout, or main gives up while the browser keeps going
+        timeout = max(1, min(_CRAWL_TIMEOUT_S * rounds, int(deadline - time.monotonic())))
+        try:
+            results = future.result(timeout=timeout)
+        except concurrent.futures.TimeoutError:
+            # free the browser pages instead of letting a stuck batch hold them
+            future.cancel()
+            print(f"Crawling {len(remaining)} URLs timed out after {timeout}s")
+            results = []
+            pages.extend({"url": u, "error": f"timed out after {timeout} seconds"} for u in remaining)
+        for r in results:
+            if r.success:
+                content = _markdown_text(r.markdown)
+                _cache_set("crawl", r.url, content)
+                pages.append({"url": r.url, "content": content})
+            else:
+                pages.append({"url": r.url, "error": r.error_message})
+    return pages
+
+def _get_ddgs() -> DDGS:
+    """Returns the shared DDGS client so searches reuse its session and cookies."""
+    global _ddgs
+    with _ddgs_lock:
+        if _ddgs is None:
+            from ddgs import DDGS
+
+            _ddgs = DDGS()
+        return _ddgs
+
+
+def _ddgs_pace() -> None:
+    """Spaces out search starts by a small random gap to stay under DuckDuckGo's rate limit."""
+    global _ddgs_next_start
+    with _ddgs_lock:
+        now = time.monotonic()
+        start = max(now, _ddgs_next_start)
+        _ddgs_next_start = start + random.uniform(0.2, 0.5)
+    if start > now:
+        time.sleep(start - now)
+
+
+def warm_up_network() -> None:
+    """Resolves the search/Wikipedia hosts and builds the DDGS client ahead of the first tool call.
+
+    main.py runs this on a background thread while the user types the research task.
+    """
+    for host in ("duckduckgo.com", "en.wikipedia.org"):
+        try:
+            socket.getaddrinfo(host, 443, type=socket.SOCK_STREAM)
+        except OSError:
+            pass
+    try:
+        _get_ddgs()
+    except Exception:
+        # the real search call reports import/setup errors
+        pass
+
 
 def duckduckgo_search(search_query: str) -> str:
     """Searches DuckDuckGo for the given query and returns the results.
@@ -259,12 +822,19 @@ def duckduckgo_search(search_query: str) -> str:
         The search results with crawlable links.
     """
     _safe_print(f"Searching DuckDuckGo for: {search_query}")
-    try:
-        results = list(DDGS().text(search_query, max_results=6))
-        filtered_results = [{"title": r["title"], "href": r["href"]} for r in results]
-    except Exception as e:
-        _safe_print(f"Error searching DuckDuckGo: {e}")
-        return json.dumps([])
+    cached = _cache_get("duckduckgo", search_query)
+    if cached is not None:
+        results = json_loads(cached)
+        filtered_results = results
+    else:
+        try:
+            with _DDGS_SEMAPHORE:
+                _ddgs_pace()
+                results = list(_get_ddgs().text(search_query, max_results=6))
+            filtered_results = [{"title": r["title"], "href": r["href"]} for r in results]
+        except Exception as e:
+            _safe_print(f"Error searching DuckDuckGo: {e}")
+            return json_dumps([]).decode()
 
     try:
         _print_duckduckgo_results(search_query, results)
@@ -272,7 +842,40 @@ def duckduckgo_search(search_query: str) -> str:
         # Best-effort printing only; the tool result should still be returned.
         pass
 
-    return json.dumps(filtered_results)
+    output = json_dumps(filtered_results).decode()
+    if cached is None:
+        _cache_set("duckduckgo", search_query, output)
+    return output
+
+
+def search_and_crawl(search_query: str, max_pages: int) -> str:
+    """Searches DuckDuckGo and crawls the top results in one step.
+
+    Args:
+        search_query: The query to search for.
+        max_pages: How many of the top results to crawl (1-6).
+    Returns:
+        A JSON list with title, url and markdown content (or an error) for each crawled result.
+    """
+    results = json_loads(duckduckgo_search(search_query))
+    titles: dict[str, str] = {}
+    for r in results[:max(1, min(max_pages, _SEARCH_CRAWL_MAX_PAGES))]:
+        href = str(r.get("href", "")).strip()
+        # crawl the real target instead of following the search engine redirect
+        url = _extract_target_url(href) or href
+        if url.startswith(("http://", "https://")):
+            titles.setdefault(url, str(r.get("title", "")))
+    if not titles:
+        return json_dumps([]).decode()
+
+    print(f"Crawling {len(titles)} URLs: {', '.join(titles)}")
+    pages = _crawl_pages(list(titles))
+    for page in pages:
+        page["title"] = titles.get(page["url"], "")
+        content = page.get("content")
+        if content is not None and len(content) > _SEARCH_CRAWL_MAX_CHARS:
+            page["content"] = content[:_SEARCH_CRAWL_MAX_CHARS] + "\n...[truncated; crawl the url for the full page]"
+    return json_dumps(pages).decode()
 
 
 def get_wikipedia_page(page: str) -> str:
@@ -291,7 +894,10 @@ def get_wikipedia_page(page: str) -> str:
         Page content as plain text
     """
     print(f"Fetching Wikipedia page: {page}")
-    
+    cached = _cache_get("wikipedia", page)
+    if cached is not None:
+        return cached
+
     url = 'https://en.wikipedia.org/w/api.php'
     params = {
         'action': 'query',
@@ -300,17 +906,28 @@ def get_wikipedia_page(page: str) -> str:
         'explaintext': True,
         'titles': page
     }
-    # Wikipedia API requires a descriptive User-Agent identifying the bot
-    # See: https://foundation.wikimedia.org/wiki/Policy:Wikimedia_Foundation_User-Agent_Policy
-    headers = {
-        'User-Agent': 'SearchAgent/1.0 (AI Research Tool Bot; https://github.com/Dariton4000/searchagent)'
-    }
-    
+    # Revalidate an expired extract instead of downloading it again.
+    headers = {}
+    stale = None
+    validators = _cache_get("wikipedia_validators", page)
+    if validators is not None:
+        stale = _cache_get("wikipedia", page, ttl=_CACHE_TTL["wikipedia_validators"])
+        if stale is not None:
+            etag, last_modified = json_loads(validators)
+            if etag:
+                headers["If-None-Match"] = etag
+            if last_modified:
+                headers["If-Modified-Since"] = last_modified
     try:
-        response = requests.get(url, params=params, headers=headers, timeout=10)
+        with _WIKI_SEMAPHORE:
+            response = _WIKI_SESSION.get(url, params=params, headers=headers, timeout=(3.05, 10))
         response.raise_for_status()
 
-        data = response.json()
+        if response.status_code == 304 and stale is not None:
+            _cache_set("wikipedia", page, stale)
+            return stale
+
+        data = json_loads(response.content)
         pages = data.get('query', {}).get('pages', {})
 
         if not pages:
@@ -318,6 +935,11 @@ def get_wikipedia_page(page: str) -> str:
         else:
             page_data = next(iter(pages.values()))
             result = page_data.get('extract', "No content found for the given page.")
+        _cache_set("wikipedia", page, result)
+        etag = response.headers.get("ETag")
+        last_modified = response.headers.get("Last-Modified")
+        if etag or last_modified:
+            _cache_set("wikipedia_validators", page, json_dumps([etag, last_modified]).decode())
     except Exception as e:
         print(f"Error fetching Wikipedia page: {e}")
         result = f"Error fetching Wikipedia page: {e}"
@@ -343,20 +965,22 @@ def create_report(title: str, content: str, sources: list) -> str:
         total_tokens = last_usage.get("total_tokens")
         print(f"Tokens: in={input_tokens} out={output_tokens} total={total_tokens}")
 
-    sanitized_title = re.sub(r'[^\w\s-]', '', title).strip().replace(' ', '_')
+    if title.isascii():
+        sanitized_title = title.translate(_TITLE_SANITIZE_ASCII)
+    else:
+        sanitized_title = _TITLE_SANITIZE_RE.sub('', title)
+    sanitized_title = sanitized_title.strip().replace(' ', '_')
     if not sanitized_title:
         return "Error: Report title cannot be empty or contain only special characters."
 
-    report_content = f"# {sanitized_title}\n\n{content}\n\n## Sources\n"
-    for source in sources:
-        report_content += f"- {source}\n"
+    parts = [f"# {sanitized_title}", "", content, "", "## Sources", *[f"- {source}" for source in sources]]
+    report_content = "\n".join(parts) + "\n"
 
     reports_dir = Path("reports")
     try:
         reports_dir.mkdir(parents=True, exist_ok=True)
         report_file = reports_dir / f"{sanitized_title}_{datetime.now().strftime('%Y%m%d_%H%M%S')}.md"
-        with report_file.open("w") as f:
-            f.write(report_content)
+        report_file.write_text(report_content, encoding="utf-8")
         print(f"Report saved to {report_file}")
         return f"DONE, Report saved to {report_file}"
     except IOError as e:
@@ -374,3 +998,10 @@ def context_details():
     total_tokens = last_usage.get("total_tokens")
 
     print(f"Tokens: in={input_tokens} out={output_tokens} total={total_tokens}")
+
+    ttft = last_usage.get("ttft_s")
+    total = last_usage.get("total_s")
+    if ttft is not None or total is not None:
+        ttft_text = f"{ttft:.2f}s" if ttft is not None else "-"
+        total_text = f"{total:.2f}s" if total is not None else "-"
+        print(f"Latency: first token={ttft_text} total={total_text}")
@@ -1,23 +1,33 @@
 from __future__ import annotations
 
-import json
+import concurrent.futures
+import functools
+import math
 import os
+import shutil
 import sys
+import threading
+import time
 from datetime import datetime
 from pathlib import Path
 from typing import Any
 
 from dotenv import load_dotenv
-from openai import OpenAI
+import httpx
+from openai import APIConnectionError, APIStatusError, OpenAI
 
 from functions import (
     duckduckgo_search,
     save_knowledge,
     get_all_knowledge,
     crawl4ai,
+    crawl4ai_batch,
+    search_and_crawl,
     create_report,
     get_wikipedia_page,
     context_details,
+    json_dumps,
+    json_loads,
 )
 import functions  # leave this import here
 
@@ -26,6 +36,63 @@ ANSI_GREY = "\033[90m"
 ANSI_GREEN = "\033[92m"
 ANSI_RESET = "\033[0m"
 
+# Shared across turns so worker threads are reused.
+_TOOL_EXECUTOR = concurrent.futures.ThreadPoolExecutor(max_workers=8, thread_name_prefix="tool")
+# Upper bound on how long a turn's tool calls may take before the model is told they failed.
+_TOOL_TIMEOUT_S = functions.TOOL_TIMEOUT_S
+# Seconds without a streamed event before a model request counts as stalled
+# (OPENAI_TIMEOUT overrides it). Matches the SDK default: local models can spend
+# minutes on prompt prefill, and high reasoning effort can go quiet for as long.
+_DEFAULT_REQUEST_TIMEOUT_S = 600.0
+# Attempts per model request when the connection drops or the stream stalls.
+_STREAM_ATTEMPTS = 3
+# Tool outputs from earlier user turns are cut to this many characters.
+_OLD_TOOL_OUTPUT_CHARS = 4096
+# Default cap on concurrent model requests from this process (LLM_INFLIGHT_LIMIT overrides it).
+_DEFAULT_LLM_INFLIGHT_LIMIT = 4
+
+
+class _StreamWriter:
+    """Coalesces streamed text deltas into fewer stdout writes and flushes.
+
+    Deltas are often only a few characters long; printing each one with
+    flush=True costs an encode pass and a write syscall per token. The active
+    color is tracked so a run of grey reasoning deltas emits its escape codes
+    once instead of around every delta.
+    """
+
+    def __init__(self, max_chars: int = 512, max_delay: float = 0.05) -> None:
+        self._parts: list[str] = []
+        self._size = 0
+        self._max_chars = max_chars
+        self._max_delay = max_delay
+        self._last_flush = time.monotonic()
+        self._color = ""
+
+    def write(self, text: str, color: str = "") -> None:
+        if color != self._color:
+            self._parts.append(ANSI_RESET + color if self._color else color)
+            self._color = color
+        self._parts.append(text)
+        self._size += len(text)
+        if self._size >= self._max_chars or time.monotonic() - self._last_flush >= self._max_delay:
+            self.flush()
+
+    def flush(self) -> None:
+        if self._parts:
+            sys.stdout.write("".join(self._parts))
+            sys.stdout.flush()
+            self._parts.clear()
+            self._size = 0
+        self._last_flush = time.monotonic()
+
+    def close(self) -> None:
+        """Resets the color and writes out anything still buffered."""
+        if self._color:
+            self._parts.append(ANSI_RESET)
+            self._color = ""
+        self.flush()
+
 
 _ENV_TEMPLATE = """# OpenAI API key (required)
 OPENAI_API_KEY=
@@ -38,6 +105,12 @@ OPENAI_REASONING_EFFORT=medium
 
 # Optional: custom OpenAI-compatible endpoint (leave blank for default)
 OPENAI_BASE_URL=
+
+# Optional: seconds without streamed output before a request is retried (default: 600)
+OPENAI_TIMEOUT=
+
+# Optional: max concurrent model requests from this process (default: 4)
+LLM_INFLIGHT_LIMIT=
 """
 
 
@@ -75,26 +148,55 @@ def _load_env() -> None:
     load_dotenv(dotenv_path=env_path)
 
 
+@functools.lru_cache(maxsize=1)
 def _model_name() -> str:
+    # Cached for the whole run (as is _reasoning_effort); only call after _load_env().
     return os.environ.get("OPENAI_MODEL", "gpt-5-mini")
 
 
+@functools.lru_cache(maxsize=1)
 def _reasoning_effort() -> str:
     # low | medium | high
     return os.environ.get("OPENAI_REASONING_EFFORT", "medium")
 
 
+@functools.lru_cache(maxsize=1)
+def _request_timeout() -> float:
+    try:
+        timeout = float(os.environ.get("OPENAI_TIMEOUT") or _DEFAULT_REQUEST_TIMEOUT_S)
+    except ValueError:
+        return _DEFAULT_REQUEST_TIMEOUT_S
+    return timeout if 0 < timeout < math.inf else _DEFAULT_REQUEST_TIMEOUT_S
+
+
+@functools.lru_cache(maxsize=1)
+def _llm_semaphore() -> threading.BoundedSemaphore:
+    # Backpressure against provider rate limits; only call after _load_env().
+    try:
+        limit = int(os.environ.get("LLM_INFLIGHT_LIMIT") or _DEFAULT_LLM_INFLIGHT_LIMIT)
+    except ValueError:
+        limit = _DEFAULT_LLM_INFLIGHT_LIMIT
+    return threading.BoundedSemaphore(max(1, limit))
+
+
 def _client() -> OpenAI:
     # Lazily create client after dotenv load.
-    kwargs: dict[str, Any] = {"api_key": os.environ.get("OPENAI_API_KEY")}
+    kwargs: dict[str, Any] = {
+        "api_key": os.environ.get("OPENAI_API_KEY"),
+        # For streams the read timeout bounds the gap between events, so a
+        # stalled response raises instead of hanging forever.
+        "timeout": httpx.Timeout(_request_timeout(), connect=10.0),
+    }
     base_url = os.environ.get("OPENAI_BASE_URL")
     if base_url:
         kwargs["base_url"] = base_url
     return OpenAI(**kwargs)
 
 
+@functools.lru_cache(maxsize=1)
 def _tool_schemas() -> list[dict[str, Any]]:
     # Strict mode requires additionalProperties=false and all props required.
+    # Cached: every turn sends the same list object; don't mutate it.
     return [
         {
             "type": "function",
@@ -130,6 +232,45 @@ def _tool_schemas() -> list[dict[str, Any]]:
                 "additionalProperties": False,
             },
         },
+        {
+            "type": "function",
+            "name": "crawl4ai_batch",
+            "description": "Crawl several URLs (http/https) concurrently and return each page's text content as markdown.",
+            "strict": True,
+            "parameters": {
+                "type": "object",
+                "properties": {
+                    "urls": {
+                        "type": "array",
+                        "items": {"type": "string"},
+                        "description": "The URLs to crawl. Each must start with http:// or https://",
+                    }
+                },
+                "required": ["urls"],
+                "additionalProperties": False,
+            },
+        },
+        {
+            "type": "function",
+            "name": "search_and_crawl",
+            "description": "Search DuckDuckGo and crawl the top results in one step; returns title, url and markdown content for each.",
+            "strict": True,
+            "parameters": {
+                "type": "object",
+                "properties": {
+                    "search_query": {
+                        "type": "string",
+                        "description": "Search query to run (treat like a Google query).",
+                    },
+                    "max_pages": {
+                        "type": "integer",
+                        "description": "How many of the top results to crawl (1-6).",
+                    },
+                },
+                "required": ["search_query", "max_pages"],
+                "additionalProperties": False,
+            },
+        },
         {
             "type": "function",
             "name": "get_wikipedia_page",
@@ -205,34 +346,111 @@ def _tool_schemas() -> list[dict[str, Any]]:
     ]
 
 
-def _call_tool(name: str, args: dict[str, Any]) -> str:
-    tool_map = {
-        "duckduckgo_search": duckduckgo_search,
-        "save_knowledge": save_knowledge,
-        "get_all_knowledge": get_all_knowledge,
-        "crawl4ai": crawl4ai,
-        "create_report": create_report,
-        "get_wikipedia_page": get_wikipedia_page,
-    }
+_TOOL_MAP = {
+    "duckduckgo_search": duckduckgo_search,
+    "save_knowledge": save_knowledge,
+    "get_all_knowledge": get_all_knowledge,
+    "crawl4ai": crawl4ai,
+    "crawl4ai_batch": crawl4ai_batch,
+    "search_and_crawl": search_and_crawl,
+    "create_report": create_report,
+    "get_wikipedia_page": get_wikipedia_page,
+}
+
 
-    fn = tool_map.get(name)
+def _call_tool(name: str, args: dict[str, Any]) -> str:
+    fn = _TOOL_MAP.get(name)
     if fn is None:
-        return json.dumps({"error": f"Unknown tool: {name}"})
+        return json_dumps({"error": f"Unknown tool: {name}"}).decode()
 
     try:
         result = fn(**args) if args else fn()
     except Exception as e:
-        return json.dumps({"error": f"Tool {name} failed", "details": str(e)})
+        return json_dumps({"error": f"Tool {name} failed", "details": str(e)}).decode()
 
     if isinstance(result, str):
         return result
 
     try:
-        return json.dumps(result)
-    except Exception:
+        return json_dumps(result).decode()
+    except (TypeError, ValueError):
         return str(result)
 
 
+def _compact_history(input_list: list[dict[str, Any]]) -> None:
+    """Shrinks items from earlier user turns before they are sent again.
+
+    Everything before the latest user message is finished work:
+    - reasoning items are dropped (the API ignores reasoning from earlier turns),
+      and the ids of that turn's other output items are removed so they no
+      longer reference the dropped reasoning;
+    - large tool outputs are cut to _OLD_TOOL_OUTPUT_CHARS. Results are cached,
+      so the model can re-run a tool cheaply if it needs the full text again.
+    """
+
+    last_user = max((i for i, item in enumerate(input_list) if item.get("role") == "user"), default=0)
+    compacted: list[dict[str, Any]] = []
+    for item in input_list[:last_user]:
+        item_type = item.get("type")
+        if item_type == "reasoning":
+            continue
+        if item_type in {"function_call", "message"} and item.get("role") != "user":
+            item.pop("id", None)
+        if item_type == "function_call_output":
+            output = item.get("output")
+            if isinstance(output, str) and len(output) > _OLD_TOOL_OUTPUT_CHARS:
+                item["output"] = output[:_OLD_TOOL_OUTPUT_CHARS] + "\n...[truncated; call the tool again for the full result]"
+        compacted.append(item)
+    input_list[:last_user] = compacted
+
+
+def _stream_response(client: OpenAI, request: dict[str, Any], timings: dict[str, float]) -> Any:
+    """Streams one Responses API call to the console and returns the final response object.
+
+    Fills timings with ttft_s (first streamed text) and total_s, in seconds.
+    """
+
+    t_start = time.monotonic()
+    stream = client.responses.create(**request, stream=True)
+
+    out = _StreamWriter()
+    # Bound once: this loop runs for every streamed token.
+    write = out.write
+    waiting_for_text = True
+    try:
+        for event in stream:
+            event_type = event.type
+            if waiting_for_text and event_type.endswith("_text.delta"):
+                timings["ttft_s"] = time.monotonic() - t_start
+                waiting_for_text = False
+
+            # Reasoning summary streaming.
+            if event_type == "response.reasoning_summary_text.delta":
+                write(event.delta, ANSI_GREY)
+
+            # Reasoning text streaming (non-OpenAI models).
+            elif event_type == "response.reasoning_text.delta":
+                write(event.delta, ANSI_GREY)
+
+            # Main assistant output text.
+            elif event_type == "response.output_text.delta":
+                write(event.delta)
+
+            elif event_type in {"response.completed", "response.incomplete", "response.failed"}:
+                timings["total_s"] = time.monotonic() - t_start
+                return event.response
+
+            elif event_type == "error":
+                raise RuntimeError(str(getattr(event, "error", event)))
+
+            else:
+                # Don't hold text back while the model is busy with something else.
+                out.flush()
+    finally:
+        out.close()
+
+    return None
+
 
 def _run_responses_agent(
     client: OpenAI,
@@ -245,42 +463,45 @@ def _run_responses_agent(
 ) -> None:
     """Runs the tool-calling loop until the model returns a normal message (no function calls)."""
 
+    _compact_history(input_list)
+
     while True:
         response_obj = None
 
         print()
 
-        stream = client.responses.create(
-            model=model,
-            instructions=instructions,
-            input=input_list,
-            tools=tools,
-            tool_choice="auto",
-            parallel_tool_calls=True,
-            reasoning={"effort": reasoning_effort, "summary": "auto"},
-            stream=True,
-        )
-
-        for event in stream:
-
-            # Reasoning summary streaming.
-            if event.type == "response.reasoning_summary_text.delta":
-                print(f"{ANSI_GREY}{event.delta}{ANSI_RESET}", end="", flush=True)
-
-            # Reasoning text streaming (non-OpenAI models).
-            elif event.type == "response.reasoning_text.delta":
-                print(f"{ANSI_GREY}{event.delta}{ANSI_RESET}", end="", flush=True)
-
-            # Main assistant output text.
-            elif event.type == "response.output_text.delta":
-                print(event.delta, end="", flush=True)
-
-            elif event.type in {"response.completed", "response.incomplete", "response.failed"}:
-                response_obj = event.response
+        request = {
+            "model": model,
+            "instructions": instructions,
+            "input": input_list,
+            "tools": tools,
+            "tool_choice": "auto",
+            "parallel_tool_calls": True,
+            "reasoning": {"effort": reasoning_effort, "summary": "auto"},
+        }
+
+        # Retry connection failures, stalled streams, rate limits and server errors
+        # with exponential backoff.
+        timings: dict[str, float] = {}
+        for attempt in range(1, _STREAM_ATTEMPTS + 1):
+            timings.clear()
+            try:
+                with _llm_semaphore():
+                    response_obj = _stream_response(client, request, timings)
                 break
-
-            elif event.type == "error":
-                raise RuntimeError(str(getattr(event, "error", event)))
+            except (APIConnectionError, APIStatusError, httpx.TransportError) as e:
+                if isinstance(e, APIStatusError) and not (e.status_code == 429 or e.status_code >= 500):
+                    raise
+                if attempt == _STREAM_ATTEMPTS:
+                    print(f"\nRequest failed after {attempt} attempts: {e}\n")
+                    return
+                delay = min(2 ** (attempt - 1), 8)
+                print(f"\n(Request failed: {str(e).rstrip('.')}. Retrying in {delay}s.)")
+                if "ttft_s" in timings:
+                    # the retry streams its answer from scratch
+                    print("(Previous partial output discarded.)")
+                print()
+                time.sleep(delay)
 
         if response_obj is None:
             print("\n(No response received)\n")
@@ -289,7 +510,7 @@ def _run_responses_agent(
         # Show usage.
         usage = getattr(response_obj, "usage", None)
         if usage is not None:
-            functions.last_usage = usage.model_dump()
+            functions.last_usage = {**usage.model_dump(), **timings}
             print()
             context_details()
 
@@ -319,56 +540,91 @@ def _run_responses_agent(
             print()  # newline after assistant answer
             return
 
+        calls: list[tuple[str, str, dict[str, Any]]] = []
         for tc in tool_calls:
             name = getattr(tc, "name", "")
             call_id = getattr(tc, "call_id", "")
             args_str = getattr(tc, "arguments", None) or "{}"
 
             try:
-                args = json.loads(args_str)
-            except json.JSONDecodeError:
+                args = json_loads(args_str)
+            except ValueError:
                 args = {}
             if not isinstance(args, dict):
                 args = {}
-
-            print(f"\n{ANSI_GREEN}Calling tool:{ANSI_RESET} {name}")
-            tool_output = _call_tool(name, args)
+            calls.append((name, call_id, args))
+
+        # Announce the whole batch in one write, before the tools start printing.
+        print("".join(f"\n{ANSI_GREEN}Calling tool:{ANSI_RESET} {name}\n" for name, _, _ in calls), end="", flush=True)
+
+        # Run all calls of this turn concurrently; outputs are appended in call order.
+        pending: list[tuple[str, str, concurrent.futures.Future[str]]] = [
+            (name, call_id, _TOOL_EXECUTOR.submit(_call_tool, name, args)) for name, call_id, args in calls
+        ]
+
+        # One deadline for the whole batch, not one per call.
+        _, not_done = concurrent.futures.wait([future for _, _, future in pending], timeout=_TOOL_TIMEOUT_S)
+        for future in not_done:
+            # Calls still queued never start; running ones can't be interrupted.
+            future.cancel()
+
+        for name, call_id, future in pending:
+            if future in not_done:
+                tool_output = json_dumps(
+                    {"error": f"Tool {name} timed out", "details": f"No result after {_TOOL_TIMEOUT_S}s"}
+                ).decode()
+            else:
+                tool_output = future.result()
 
             input_list.append({"type": "function_call_output", "call_id": call_id, "output": tool_output})
 
 
+# Kept free of per-run values (the date goes into the first user message) so the
+# prompt prefix is identical across requests and can be served from the
+# provider's prompt cache.
+_INSTRUCTIONS = (
+    "You are a task-focused AI researcher. "
+    "Begin researching immediately. Perform multiple online searches to gather reliable information. "
+    "Crawl webpages for context; use crawl4ai_batch to crawl several pages at once, "
+    "or search_and_crawl to search and read the top results in one step. When possible use Wikipedia as a source. "
+    "Research extensively: multiple searches and crawls; one source is not enough. "
+    "After crawling a webpage, store any useful knowledge in the research knowledge base (treat it like permanent memory). "
+    "Recall all stored knowledge before creating the final report. "
+    "Ground information in reliable sources. Mark assumptions clearly. "
+    "Produce an extensive report in markdown format using the create_report tool (be sure to call it). "
+    "Create the report ONLY when you are done with all research. Already saved reports cannot be changed or deleted. "
+    "Add tables when it helps clarity."
+)
+
+
 def researcher(client: OpenAI, query: str) -> None:
-    now = datetime.now().strftime("%Y-%m-%d %H:%M:%S")
-    instructions = (
-        f"You are a task-focused AI researcher. The current date and time is {now}. "
-        "Begin researching immediately. Perform multiple online searches to gather reliable information. "
-        "Crawl webpages for context. When possible use Wikipedia as a source. "
-        "Research extensively: multiple searches and crawls; one source is not enough. "
-        "After crawling a webpage, store any useful knowledge in the research knowledge base (treat it like permanent memory). "
-        "Recall all stored knowledge before creating the final report. "
-        "Ground information in reliable sources. Mark assumptions clearly. "
-        "Produce an extensive report in markdown format using the create_report tool (be sure to call it). "
-        "Create the report ONLY when you are done with all research. Already saved reports cannot be changed or deleted. "
-        "Add tables when it helps clarity."
-    )
+    # Load the knowledge base in the background so the final recall is served from memory.
+    threading.Thread(target=functions.prime_knowledge_cache, name="knowledge-prefetch", daemon=True).start()
 
+    now = datetime.now().strftime("%Y-%m-%d %H:%M:%S")
     tools = _tool_schemas()
     model = _model_name()
     reasoning_effort = _reasoning_effort()
 
     input_list: list[dict[str, Any]] = [
-        {"role": "user", "content": f"Here is the research query given by the user: '{query}'"}
+        {
+            "role": "user",
+            "content": f"The current date and time is {now}. Here is the research query given by the user: '{query}'",
+        }
     ]
 
-    print("Researcher: ", end="", flush=True)
-    _run_responses_agent(
-        client,
-        instructions=instructions,
-        input_list=input_list,
-        tools=tools,
-        model=model,
-        reasoning_effort=reasoning_effort,
-    )
+    def _run_turn() -> None:
+        print("Researcher: ", end="", flush=True)
+        _run_responses_agent(
+            client,
+            instructions=_INSTRUCTIONS,
+            input_list=input_list,
+            tools=tools,
+            model=model,
+            reasoning_effort=reasoning_effort,
+        )
+
+    _run_turn()
 
     while True:
         try:
@@ -381,15 +637,7 @@ def researcher(client: OpenAI, query: str) -> None:
             break
 
         input_list.append({"role": "user", "content": user_input})
-        print("Researcher: ", end="", flush=True)
-        _run_responses_agent(
-            client,
-            instructions=instructions,
-            input_list=input_list,
-            tools=tools,
-            model=model,
-            reasoning_effort=reasoning_effort,
-        )
+        _run_turn()
 
 
 def main() -> None:
@@ -400,14 +648,15 @@ def main() -> None:
         print(f"OPENAI_API_KEY is not set. Put it in {env_path}, then rerun.")
         return
 
+    # Every run starts with an empty knowledge base.
     knowledge_dir = Path("research_knowledge")
+    shutil.rmtree(knowledge_dir, ignore_errors=True)
     knowledge_dir.mkdir(exist_ok=True)
     report_dir = Path("reports")
     report_dir.mkdir(exist_ok=True)
 
-    # Deletes all existing knowledge files
-    for file in knowledge_dir.glob("*.json"):
-        file.unlink()
+    # Resolve hosts and set up the search client while the user is typing.
+    threading.Thread(target=functions.warm_up_network, name="network-warmup", daemon=True).start()
 
     research_topic = input("Please provide a research task for the ai researcher: ").strip()
     if not research_topic: